@@ -1,18 +1,94 @@
 #!/usr/bin/env python3
 import argparse
+import concurrent.futures
+import functools
+import hashlib
+import io
 import json
 import logging
+import os
 import pathlib
 import re
+import shutil
 import subprocess
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
     level=logging.INFO,
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+# Directory holding this script
+MODULE_DIR = pathlib.Path(__file__).resolve().parent
+
+# Template placeholders and the run parameters used to replace them
+PLACEHOLDERS = {
+    "project_id": "project",
+    "flowcell_id": "flowcell",
+    "author_name": "author",
+    "ngi_path": "ngi_path",
+    "genstat_url": "genstat_url",
+    "charon_url": "charon_url",
+    "config_path": "config_path",
+}
+PLACEHOLDER_RE = re.compile(f"<({'|'.join(PLACEHOLDERS)})>")
+
+# Run parameters holding filesystem paths
+PATH_KEYS = {"templates_path", "ngi_path", "config_path", "quarto_path", "output_path"}
+
+# Title and subtitle of each checklist
+HEADER_TITLES = {
+    "qc": (
+        "QC and Delivery",
+        "Bioinformatic Sample QC and Preparation for Data Delivery",
+    ),
+    "delivery": ("Delivery", "Bioinformatic Sample Delivery"),
+    "close": ("Close", "Bioinformatic Sample Close"),
+}
+
+# Static part of the markdown header, following the subtitle
+HEADER_TAIL = "\n".join(
+    [
+        "description: 'Automatically generated checklist'",
+        "date: today",
+        "lang: en-GB",
+        "format:",
+        "  html:",
+        "    page-layout: full",
+        "    anchor-sections: true",
+        "    tbl-cap-location: bottom",
+        "    theme:",
+        "      light: flatly",
+        "      dark: darkly",
+        "  commonmark:",
+        "    wrap: none",
+        "version: 1.0",
+        "---",
+        "",
+    ]
+)
+
+# HTML tags stripped from the markdown output for aesthetic purposes
+STRIP_TAGS_RE = re.compile(r"</?div>")
+
+# Opening fence of an executable code cell, which only Quarto can render
+CODE_CELL_RE = re.compile(r"^```+\s*\{", re.MULTILINE)
+
+# Markdown files that are never removed during the cleanup
+README_RE = re.compile("README.md")
+
+# Expected formats of the project and flowcell identifiers
+PROJECT_ID_RE = re.compile(r"P[0-9]{5}")
+FLOWCELL_ID_RE = re.compile(
+    r"[0-9]{6,8}_[A-Z]{1,2}[0-9]{5}_[0-9]{3,4}_[A-Z0-9]{9,10}(-[A-Z0-9]{5})?"
+)
+
 
 def parse_args():
     """Parse command-line arguments."""
@@ -111,6 +187,18 @@ def parse_args():
         default=False,
         help="Force overwrite of existing files.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=None,
+        help="Ignore cached renders and run Quarto for every checklist.",
+    )
+    parser.add_argument(
+        "--no-quarto",
+        action="store_true",
+        default=None,
+        help="Render markdown checklists without Quarto when they have no code cells.",
+    )
     parser.add_argument(
         "--log-level",
         type=str,
@@ -124,26 +212,36 @@ def parse_args():
 def set_run_parameters(args):
     """Set the run parameters based on the command-line arguments."""
     config = {}
+    arg_vars = vars(args)
     # Load the config file if it exists
-    if pathlib.Path("config.json").is_file():
-        with open("config.json", "r") as f:
-            config = json.load(f)
-        # Check for alien keys in the config file
-        not_found = {key for key in config.keys() if key not in vars(args).keys()}
+    try:
+        raw_config = pathlib.Path("config.json").read_bytes()
+    except FileNotFoundError:
+        pass
+    else:
+        file_config = orjson.loads(raw_config) if orjson else json.loads(raw_config)
+        # Check for alien keys and convert string paths in a single pass
+        not_found = set()
+        for key, value in file_config.items():
+            if key not in arg_vars:
+                not_found.add(key)
+            elif key in PATH_KEYS and value is not None:
+                value = pathlib.Path(value)
+            config[key] = value
         if not_found:
             logging.warning(
-                f"One or more keys in the config file are not among the expected keys: {not_found}"
+                "One or more keys in the config file are not among the expected keys: %s",
+                not_found,
             )
-        for key, value in config.items():
-            if "path" in key or "dir" in key:
-                # Convert string paths to pathlib.Path objects
-                config[key] = pathlib.Path(value)
 
     # Re-set the config parameters based on command-line arguments
-    for key, value in vars(args).items():
-        if key not in config or value is not None:
-            # Update the config with command-line arguments
-            config[key] = value
+    config.update(
+        {
+            key: value
+            for key, value in arg_vars.items()
+            if key not in config or value is not None
+        }
+    )
 
     # Set the output directory and file basename
     prefix = f"{datetime.now().strftime('%Y%m%d')}_" if args.timestamp else ""
@@ -151,15 +249,14 @@ def set_run_parameters(args):
     config["basename"] = prefix[:-1] if prefix.endswith("_") else prefix
     if config["basename"] != "" and config["output_structure"] == "nested":
         config["output_path"] = config["output_path"].joinpath(config["basename"])
-        if not config["output_path"].is_dir():
-            config["output_path"].mkdir(parents=True, exist_ok=True)
+        config["output_path"].mkdir(parents=True, exist_ok=True)
 
     return config
 
 
 def validate_project_id(project_id: str):
     """Validate the project ID format."""
-    if not re.match(r"^P[0-9]{5}$", project_id):
+    if not PROJECT_ID_RE.fullmatch(project_id):
         raise ValueError(
             "Project ID must start with 'P' followed by 4 or 5 digits (e.g., P1234 or P12345)."
         )
@@ -167,32 +264,37 @@ def validate_project_id(project_id: str):
 
 def validate_flowcell_id(flowcell_id: str):
     """Validate the flowcell ID format."""
-    if not re.match(
-        r"^[0-9]{6,8}_[A-Z]{1,2}[0-9]{5}_[0-9]{3,4}_[A-Z0-9]{9,10}(-[A-Z0-9]{5})?$",
-        flowcell_id,
-    ):
+    if not FLOWCELL_ID_RE.fullmatch(flowcell_id):
         raise ValueError(
             "Flowcell ID is not in the expected format. Please check the ID."
         )
 
 
+def get_quarto_version(quarto_path: pathlib.Path) -> str | None:
+    """Return the version of a Quarto executable, or None if it cannot be run."""
+    try:
+        result = subprocess.run(
+            [str(quarto_path), "--version"], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
 def validate_quarto_path(quarto_path: pathlib.Path):
     """Validate the Quarto path."""
     # Check if the Quarto executable exists and is accessible
-    status, quarto_version = subprocess.getstatusoutput(f"{quarto_path} --version")
-    if status != 0:
+    quarto_version = get_quarto_version(quarto_path) if quarto_path else None
+    if quarto_version is None:
         logging.error(
             "Quarto not found in the specified path. Attempting to find it in the system path."
         )
         # Attempt to find Quarto in the system path
-        status, quarto_path = subprocess.getstatusoutput("which quarto")
-        if status != 0:
+        quarto_path = shutil.which("quarto")
+        if quarto_path is None:
             logging.error("Quarto not found in the system path.")
             exit(1)
-        else:
-            status, quarto_version = subprocess.getstatusoutput(
-                f"{quarto_path} --version"
-            )
+        quarto_version = get_quarto_version(quarto_path)
     return pathlib.Path(quarto_path), quarto_version
 
 
@@ -213,194 +315,308 @@ def validate_templates(template_path: pathlib.Path):
     ]
     if missing_templates:
         logging.error(
-            f"The following required templates are missing: {', '.join(missing_templates)}"
+            "The following required templates are missing: %s",
+            ", ".join(missing_templates),
         )
         exit(1)
 
 
+@functools.lru_cache(maxsize=8)
+def read_template(template_path: str, mtime_ns: int) -> str:
+    """Read a template file, caching its content until the file is modified."""
+    return pathlib.Path(template_path).read_text()
+
+
+def has_code_cells(template_path: pathlib.Path) -> bool:
+    """Check whether a template contains executable code cells."""
+    content = read_template(str(template_path), template_path.stat().st_mtime_ns)
+    return CODE_CELL_RE.search(content) is not None
+
+
 def prepare_markdown_header(config: dict, template: str):
     """Prepare the markdown header with project and author information."""
     # Set the title and subtitle based on the template
-    if template == "qc":
-        title = "QC and Delivery"
-        subtitle = "Bioinformatic Sample QC and Preparation for Data Delivery"
-    elif template == "delivery":
-        title = "Delivery"
-        subtitle = "Bioinformatic Sample Delivery"
-    elif template == "close":
-        title = "Close"
-        subtitle = "Bioinformatic Sample Close"
-    else:
-        logging.error(f"Unknown template '{template}'. Cannot prepare markdown header.")
+    if template not in HEADER_TITLES:
+        logging.error(
+            "Unknown template '%s'. Cannot prepare markdown header.", template
+        )
         exit(1)
-    # Prepare the markdown header
-    md_header = "---\n"
-    md_header += (
+    title, subtitle = HEADER_TITLES[template]
+    # Prepare the variable lines of the markdown header
+    title_line = (
         f"title: {config['project']} {title}\n"
         if config["project"]
-        else "title: Bioinformatic {title}\n"
+        else f"title: Bioinformatic {title}\n"
     )
-    md_header += (
+    author_line = (
         f"author: {config['author']} <{config['email']}>\n"
         if config["author"] and config["email"]
         else f"author: {config['author']}\n"
         if config["author"]
         else ""
     )
-    md_header += "\n".join(
-        [
-            f"subtitle: '{subtitle}'",
-            "description: 'Automatically generated checklist'",
-            "date: today",
-            "lang: en-GB",
-            "format:",
-            "  html:",
-            "    page-layout: full",
-            "    anchor-sections: true",
-            "    tbl-cap-location: bottom",
-            "    theme:",
-            "      light: flatly",
-            "      dark: darkly",
-            "  commonmark:",
-            "    wrap: none",
-            "version: 1.0",
-            "---",
-            "",
-        ]
-    )
-    return md_header
+    return f"---\n{title_line}{author_line}subtitle: '{subtitle}'\n{HEADER_TAIL}"
 
 
 def parse_markdown_templates(config: dict) -> dict:
     """Parse the markdown templates and replace placeholders with actual values."""
 
-    def parse_line(config, line):
-        """Parse a line of the template and replace placeholders with actual values."""
-        if config["project"]:
-            line = re.sub(r"<project_id>", f"{config['project']}", line)
-        if config["flowcell"]:
-            line = re.sub(r"<flowcell_id>", f"{config['flowcell']}", line)
-        if config["author"]:
-            line = re.sub(r"<author_name>", f"{config['author']}", line)
-        if config["ngi_path"]:
-            line = re.sub(r"<ngi_path>", f"{config['ngi_path']}", line)
-        if config["genstat_url"]:
-            line = re.sub(r"<genstat_url>", f"{config['genstat_url']}", line)
-        if config["charon_url"]:
-            line = re.sub(r"<charon_url>", f"{config['charon_url']}", line)
-        if config["config_path"]:
-            line = re.sub(r"<config_path>", f"{config['config_path']}", line)
-        return line
-
-    def write_template(label: str):
-        """Write the template content to the output file."""
-        outname = (
-            f"{config['basename']}_{label}.qmd"
-            if config["basename"] != ""
-            else f"{label}.qmd"
-        )
+    basename = config["basename"]
+    # Map each placeholder to its value, leaving the unset ones untouched
+    substitutions = {
+        placeholder: f"{config[key]}"
+        for placeholder, key in PLACEHOLDERS.items()
+        if config[key]
+    }
+
+    def replace_placeholder(match: re.Match) -> str:
+        """Return the value for a matched placeholder, or the placeholder itself."""
+        return substitutions.get(match.group(1), match.group(0))
+
+    def parse_template(content: str) -> str:
+        """Replace the placeholders in the template content with actual values."""
+        # Nothing to replace when no run parameter was set or the template
+        # has no placeholder at all
+        if not substitutions or "<" not in content:
+            return content
+        return PLACEHOLDER_RE.sub(replace_placeholder, content)
+
+    def write_template(label: str) -> str:
+        """Write the template content to the output file and return its name."""
+        outname = f"{basename}_{label}.qmd" if basename != "" else f"{label}.qmd"
+        # Read the whole template and substitute it in a single pass
+        template_path = config["templates_path"].joinpath(f"{label}_template.qmd")
+        content = read_template(str(template_path), template_path.stat().st_mtime_ns)
         with open(outname, "w") as output_file:
             output_file.write(header)
-            # Write the template content
-            with open(
-                config["templates_path"].joinpath(f"{label}_template.qmd"), "r"
-            ) as template_file:
-                for line in template_file:
-                    output_file.write(parse_line(config, line))
+            output_file.write(parse_template(content))
+        return outname
+
+    templates_dict = {}
 
     # Prepare QC template
     header = prepare_markdown_header(config, "qc")
-    write_template("QC")
+    templates_dict["QC"] = write_template("QC")
 
     # Prepare Delivery template
     header = prepare_markdown_header(config, "delivery")
-    write_template("Delivery")
+    templates_dict["Delivery"] = write_template("Delivery")
 
     # Prepare Close template
     header = prepare_markdown_header(config, "close")
-    write_template("Close")
-
-    return {
-        "QC": f"{config['basename']}_QC.qmd" if config["basename"] != "" else "QC.qmd",
-        "Delivery": f"{config['basename']}_Delivery.qmd"
-        if config["basename"] != ""
-        else "Delivery.qmd",
-        "Close": f"{config['basename']}_Close.qmd"
-        if config["basename"] != ""
-        else "Close.qmd",
-    }
+    templates_dict["Close"] = write_template("Close")
+
+    return templates_dict
 
 
-def generate_markdown_output(config: dict, cmd: str, label: str):
+def clean_markdown_line(line: str) -> str:
+    """Tidy up a line of the markdown generated by Quarto."""
+    if line.startswith("<"):
+        # Remove some HTML tags for aesthetic purposes
+        line = STRIP_TAGS_RE.sub("", line).strip()
+    if line.startswith(">"):
+        line = line.replace("> -", "-")
+    return line.replace("☐", "[ ]")
+
+
+def generate_markdown_output(cmd: list, output_file: pathlib.Path):
     """Generate the markdown output using Quarto."""
     logging.debug("Generating markdown via Quarto...")
     try:
-        _ = subprocess.run(cmd, shell=True, check=True, capture_output=True)
-        output_stream = []
-        outname = (
-            f"{config['basename']}_{label}.md"
-            if config["basename"] != ""
-            else f"{label}.md"
-        )
-        with open(config["output_path"].joinpath(outname), "r") as input_file:
-            for line in input_file:
-                if line.startswith("<"):
-                    # Remove some HTML tags for aesthetic purposes
-                    line = re.sub(r"<div>", "", line).strip()
-                    line = re.sub(r"</div>", "", line).strip()
-                if line.startswith(">"):
-                    line = re.sub(r"> -", "-", line)
-                line = re.sub(r"☐", "[ ]", line)
-                output_stream.append(line)
-        with open(config["output_path"].joinpath(outname), "w") as output_file:
-            for line in output_stream:
-                output_file.write(line)
+        # Quarto writes the document to stdout, so it is tidied up straight away
+        result = subprocess.run(cmd, check=True, capture_output=True, encoding="utf-8")
+        # Iterate the lines like a file, splitting at newlines only
+        with open(output_file, "w", encoding="utf-8") as output_stream:
+            output_stream.writelines(
+                clean_markdown_line(line) for line in io.StringIO(result.stdout)
+            )
         logging.debug("Markdown file generated successfully.")
     except subprocess.CalledProcessError as e:
-        logging.error(f"Error generating markdown: {e}")
+        logging.error("Error generating markdown: %s", e)
+        logging.error(e.stderr.strip())
         exit(1)
 
 
-def generate_html_output(config: dict, cmd: str):
+def generate_static_markdown(template: str, output_file: pathlib.Path):
+    """Generate the markdown output of a static template, skipping Quarto."""
+    logging.debug("Generating markdown without Quarto...")
+    # Drop the YAML header, which Quarto does not carry over to the markdown
+    body = pathlib.Path(template).read_text().partition("\n---\n")[2]
+    with open(output_file, "w", encoding="utf-8") as output_stream:
+        output_stream.writelines(
+            clean_markdown_line(line) for line in io.StringIO(body)
+        )
+    logging.debug("Markdown file generated successfully.")
+
+
+def generate_html_output(config: dict, cmd: list):
     """Generate the HTML output using Quarto."""
     logging.debug("Generating HTML via Quarto...")
     try:
-        _ = subprocess.run(cmd, shell=True, check=True, capture_output=True)
+        subprocess.run(
+            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
         logging.debug("HTML file generated successfully.")
     except subprocess.CalledProcessError as e:
-        logging.warning(f"Error generating HTML: {e}")
+        logging.warning("Error generating HTML: %s", e)
+        logging.warning(e.stderr.decode(errors="replace").strip())
         exit(1)
 
 
+def get_cache_key(config: dict, template: str) -> str:
+    """Compute the key identifying a rendered template in the cache."""
+    digest = hashlib.sha256(pathlib.Path(template).read_bytes())
+    # The rendered date also depends on the day, as the header uses 'date: today'
+    digest.update(
+        "\0".join(
+            [
+                config["format"],
+                config["quarto_version"] or "",
+                datetime.now().strftime("%Y-%m-%d"),
+            ]
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+def render_template(config: dict, label: str, template: str, static: bool = False):
+    """Render a prepared template to the requested output format using Quarto.
+
+    Static templates, which have no code cells, are written out directly.
+    """
+    logging.debug("Generating %s output using template: %s", label, template)
+    if config["format"] not in ("markdown", "html"):
+        logging.error("Invalid format specified. Use 'markdown' or 'html'.")
+        exit(1)
+    basename = config["basename"]
+    output_path = config["output_path"]
+    extension = "md" if config["format"] == "markdown" else "html"
+    outname = (
+        f"{basename}_{label}.{extension}" if basename != "" else f"{label}.{extension}"
+    )
+    output_file = output_path / outname
+
+    # Static markdown templates need no rendering at all
+    if static:
+        generate_static_markdown(template, output_file)
+        return
+
+    # Reuse a previous render of the same template, if any
+    cache_prefix = f"{output_file.stem}."
+    cache_suffix = f".{config['format']}"
+    cache_file = config["qmds_path"].joinpath(
+        "cache", f"{cache_prefix}{get_cache_key(config, template)}{cache_suffix}"
+    )
+    if not config["no_cache"] and cache_file.is_file():
+        logging.debug("Using cached %s output: %s", label, cache_file)
+        shutil.copyfile(cache_file, output_file)
+        return
+
+    # Prepare the base command to run Quarto
+    cmd = [str(config["quarto_path"]), "render", template, "--no-clean"]
+    cmd += ["--output-dir", str(output_path), "--execute-dir", str(output_path)]
+    if config["format"] == "markdown":
+        cmd += ["--to", "commonmark", "--output", "-"]
+        # Generate the Markdown file and place it in the specified directory
+        generate_markdown_output(cmd, output_file)
+    else:
+        cmd += ["--to", "html", "--embed-resources", "--standalone", "--debug"]
+        cmd += ["--output", outname]
+        # Generate the HTML file and place it in the specified directory
+        generate_html_output(config, cmd)
+
+    # Store the output for later runs, replacing the older renders of this checklist
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with os.scandir(cache_file.parent) as entries:
+        for entry in entries:
+            if (
+                entry.name.startswith(cache_prefix)
+                and entry.name.endswith(cache_suffix)
+                and len(entry.name) == len(cache_file.name)
+                and entry.name != cache_file.name
+            ):
+                logging.debug("Removing stale cached output: %s", entry.path)
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+    shutil.copyfile(output_file, cache_file)
+
+
+def scan_tree(root: str, prune=None):
+    """Recursively yield the entries under a directory, children before parents.
+
+    Directories whose name satisfies prune are yielded without being walked,
+    and unreadable directories are skipped, as os.walk does.
+    """
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not (
+                prune and prune(entry.name)
+            ):
+                yield from scan_tree(entry.path, prune)
+            yield entry
+
+
 def cleanup_temporary_data(config: dict):
     """Remove temporary files and directories created during the process."""
-    files_list = list(
-        pathlib.Path(__file__).resolve().parent.glob(f"{config['basename']}*.qmd")
-    )
+    basename = config["basename"]
+
     # Move qmd files to the quarto directory
-    for qmd in files_list:
-        if qmd.is_file():
-            qmd.rename(config["qmds_path"].joinpath(qmd.name))
-
-    # Remove the md files
-    files_list = list(pathlib.Path().glob(f"**/{config['basename']}*.md"))
-    files_list = [x for x in files_list if not re.match("README.md", x.name)]
-    for tmp_md in files_list:
-        if tmp_md.is_file():
-            logging.debug(f"Removing temporary file: {tmp_md}")
-            tmp_md.unlink()
-
-    # Remove the html files
-    paths_list = list(pathlib.Path().glob(f"**/{config['basename']}_*_files"))
-    for tmp_path in paths_list:
-        for path, dirs, files in tmp_path.walk(top_down=False):
-            for file in files:
-                file_path = pathlib.Path(path).joinpath(file)
-                if file_path.is_file():
-                    logging.debug(f"Removing temporary file: {file_path}")
-                    file_path.unlink()
-            logging.debug(f"Removing temporary directory: {path}")
-            path.rmdir()
+    qmds_path = config["qmds_path"]
+    with os.scandir(MODULE_DIR) as entries:
+        for entry in entries:
+            if (
+                entry.name.startswith(basename)
+                and entry.name.endswith(".qmd")
+                and entry.is_file()
+            ):
+                try:
+                    os.replace(entry.path, qmds_path.joinpath(entry.name))
+                except FileNotFoundError:
+                    pass
+
+    def is_temporary_dir(name: str) -> bool:
+        """Check whether a directory holds the resources of a rendered checklist."""
+        return (
+            name.startswith(f"{basename}_")
+            and name.endswith("_files")
+            and len(name) >= len(basename) + len("__files")
+        )
+
+    def remove_file(file_path: str):
+        """Remove a file, ignoring it if it no longer exists."""
+        logging.debug("Removing temporary file: %s", file_path)
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+
+    # Collect the md files and the html resource folders in a single bottom-up pass
+    files_list, dirs_list = [], []
+    for entry in scan_tree(".", prune=is_temporary_dir):
+        if entry.is_dir(follow_symlinks=False):
+            if is_temporary_dir(entry.name):
+                dirs_list.append(entry.path)
+        elif (
+            entry.name.startswith(basename)
+            and entry.name.endswith(".md")
+            and not README_RE.match(entry.name)
+        ):
+            files_list.append(entry.path)
+
+    # Unlink the files concurrently, as each removal is bound by metadata latency
+    if files_list:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=32) as executor:
+            list(executor.map(remove_file, files_list))
+    # Remove the html resource folders with their whole content
+    for dir_path in dirs_list:
+        logging.debug("Removing temporary directory: %s", dir_path)
+        shutil.rmtree(dir_path, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -421,46 +637,67 @@ if __name__ == "__main__":
     if config["flowcell"]:
         validate_flowcell_id(config["flowcell"])
 
-    # Check if the Quarto executable exists and is accessible
-    config["quarto_path"], quarto_version = validate_quarto_path(config["quarto_path"])
-
     # Check if the template file exists
     validate_templates(config["templates_path"])
 
+    # Check whether Quarto is needed at all
+    if config["no_quarto"] and config["format"] != "markdown":
+        logging.error("The --no-quarto option is only available for markdown output.")
+        exit(1)
+    labels = ("QC", "Delivery", "Close")
+    static_labels = (
+        {
+            label
+            for label in labels
+            if not has_code_cells(
+                config["templates_path"].joinpath(f"{label}_template.qmd")
+            )
+        }
+        if config["no_quarto"]
+        else set()
+    )
+
+    # Check if the Quarto executable exists and is accessible
+    if len(static_labels) < len(labels):
+        config["quarto_path"], config["quarto_version"] = validate_quarto_path(
+            config["quarto_path"]
+        )
+    else:
+        config["quarto_version"] = None
+
     # Create the output directory if it doesn't exist
     config["output_path"].mkdir(parents=True, exist_ok=True)
 
     # Set the path for the Quarto markdown files, and create the directory if it doesn't exist
-    config["qmds_path"] = pathlib.Path(__file__).resolve().parent.joinpath("qmds")
+    config["qmds_path"] = MODULE_DIR.joinpath("qmds")
     config["qmds_path"].mkdir(parents=True, exist_ok=True)
 
     # Check if the output directory exists
     if not args.force:
-        if config["basename"] != "":
-            files_list = [
-                x
-                for x in config["output_path"].glob(f"{config['basename']}*")
-                if x.is_file()
-            ]
-        else:
-            files_list = [
-                x
-                for x in [
-                    "QC.html",
-                    "QC.md",
-                    "Delivery.html",
-                    "Delivery.md",
-                    "Close.html",
-                    "Close.md",
-                ]
-                if config["output_path"].joinpath(x).is_file()
-            ]
+        basename = config["basename"]
+        default_names = {
+            f"{label}.{extension}"
+            for label in ("QC", "Delivery", "Close")
+            for extension in ("html", "md")
+        }
+        # List the conflicting files with a single directory read
+        with os.scandir(config["output_path"]) as entries:
+            files_list = sorted(
+                entry.path
+                for entry in entries
+                if (
+                    entry.name.startswith(basename)
+                    if basename != ""
+                    else entry.name in default_names
+                )
+                and entry.is_file()
+            )
         if files_list:
             logging.error(
                 "The following files already exist and will not be overwritten:"
             )
             for file in files_list:
-                logging.error(f"    '{file}'")
+                logging.error("    '%s'", file)
             logging.error(
                 "Use --force to overwrite existing files or specify a different output directory."
             )
@@ -469,56 +706,41 @@ if __name__ == "__main__":
     # Summarise the run parameters
     logging.debug("-" * 40)
     logging.debug("Run Parameters:")
-    logging.debug(f"    Quarto Path: {config['quarto_path']}")
-    logging.debug(f"    Quarto Version: {quarto_version}")
-    logging.debug(f"    Templates Path: {config['templates_path']}")
-    logging.debug(f"    Project ID: {config['project']}")
-    logging.debug(f"    Flowcell ID: {config['flowcell']}")
-    logging.debug(f"    NGI Path: {config['ngi_path']}")
-    logging.debug(f"    Author: {config['author']}")
-    logging.debug(f"    Author Email: {config['email']}")
-    logging.debug(f"    Output Directory: {config['output_path']}")
-    logging.debug(f"    Output Format: {config['format']}")
-    logging.debug(f"    Output Structure: {config['output_structure']}")
-    logging.debug(f"    Timestamp: {args.timestamp}")
+    logging.debug("    Quarto Path: %s", config["quarto_path"])
+    logging.debug("    Quarto Version: %s", config["quarto_version"])
+    logging.debug("    Templates Path: %s", config["templates_path"])
+    logging.debug("    Project ID: %s", config["project"])
+    logging.debug("    Flowcell ID: %s", config["flowcell"])
+    logging.debug("    NGI Path: %s", config["ngi_path"])
+    logging.debug("    Author: %s", config["author"])
+    logging.debug("    Author Email: %s", config["email"])
+    logging.debug("    Output Directory: %s", config["output_path"])
+    logging.debug("    Output Format: %s", config["format"])
+    logging.debug("    Output Structure: %s", config["output_structure"])
+    logging.debug("    Timestamp: %s", args.timestamp)
     if config["format"] == "markdown":
-        logging.debug(f"    Markdown Output Path: {config['output_path']}")
-        logging.debug(f"    Markdown Filename: {config['basename']}.md")
+        logging.debug("    Markdown Output Path: %s", config["output_path"])
+        logging.debug("    Markdown Filename: %s.md", config["basename"])
     else:
-        logging.debug(f"    HTML Output Path: {config['output_path']}")
-        logging.debug(f"    HTML Filename: {config['basename']}.html")
+        logging.debug("    HTML Output Path: %s", config["output_path"])
+        logging.debug("    HTML Filename: %s.html", config["basename"])
     logging.debug("-" * 40)
 
     # Write the markdown template, including the dynamic content
     templates_dict = parse_markdown_templates(config)
 
-    for key, template in templates_dict.items():
-        logging.debug(f"Generating {key} output using template: {template}")
-        # Prepare the base command to run Quarto
-        cmd = f"{config['quarto_path']} render {template} --no-clean"
-        cmd += f" --output-dir {config['output_path']} --execute-dir {config['output_path']}"
-        if config["format"] == "markdown":
-            cmd += " --to commonmark"
-            cmd += (
-                f" --output {config['basename']}_{key}.md"
-                if config["basename"] != ""
-                else f" --output {key}.md"
-            )
-            # Generate the Markdown file and place it in the specified directory
-            generate_markdown_output(config, cmd, key)
-
-        elif config["format"] == "html":
-            cmd += " --to html --embed-resources --standalone --debug "
-            cmd += (
-                f"--output {config['basename']}_{key}.html"
-                if config["basename"] != ""
-                else f" --output {key}.html"
+    # Render the templates concurrently, as Quarto start-up dominates each render
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(templates_dict)
+    ) as executor:
+        list(
+            executor.map(
+                lambda item: render_template(
+                    config, *item, static=item[0] in static_labels
+                ),
+                templates_dict.items(),
             )
-            # Generate the HTML file and place it in the specified directory
-            generate_html_output(config, cmd)
-        else:
-            logging.error("Invalid format specified. Use 'markdown' or 'html'.")
-            exit(1)
+        )
 
     logging.info("All output files generated successfully.")
     logging.debug("-" * 40)